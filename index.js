@@ -5,6 +5,9 @@ const mqtt = require('mqtt');
 const cors = require('cors');
 const path = require('path');
 const fs = require('fs');
+const cluster = require('cluster');
+const { once } = require('events');
+const { setTimeout: sleep } = require('timers/promises');
 
 const app = express();
 app.use(cors());
@@ -22,29 +25,72 @@ const MQTT_PASS = process.env.MQTT_PASS || "";
 const MQTT_CA_CERT = process.env.MQTT_CA_CERT || "";
 const MQTT_TOPIC_IMU = "/mobile/imu";
 const MQTT_TOPIC_GPS = "/mobile/gps";
+const BATCH_SIZE = parseInt(process.env.BATCH_SIZE || "500");
+const FLUSH_INTERVAL_MS = parseInt(process.env.FLUSH_INTERVAL_MS || "200");
+const FAST_INSERT = process.env.FAST_INSERT === "1";
+const INGEST_WORKERS = parseInt(process.env.INGEST_WORKERS || "2");
+const INGEST_QUEUE_MAX = parseInt(process.env.INGEST_QUEUE_MAX || "100000");
+const DEDUP_CAPACITY = parseInt(process.env.DEDUP_CAPACITY || "100000");
+const MONGO_MAX_POOL_SIZE = parseInt(process.env.MONGO_MAX_POOL_SIZE || "50");
+const MONGO_MIN_POOL_SIZE = parseInt(process.env.MONGO_MIN_POOL_SIZE || "5");
+// Wire compression; zlib is built in, "zstd" / "snappy" need @mongodb-js/zstd / snappy installed
+const MONGO_COMPRESSORS = process.env.MONGO_COMPRESSORS || "zlib";
+const WEB_CONCURRENCY = parseInt(process.env.WEB_CONCURRENCY || "1");
+const LIST_CACHE_TTL_MS = parseInt(process.env.LIST_CACHE_TTL_MS || "60000");
+const STREAM_BATCH_SIZE = parseInt(process.env.STREAM_BATCH_SIZE || "500");
+const QUERY_CACHE_SIZE = 1024;
+const IMU_RING_SIZE = parseInt(process.env.IMU_RING_SIZE || "60000");
+const GPS_RING_SIZE = parseInt(process.env.GPS_RING_SIZE || "10000");
+const RING_WINDOW_MS = parseFloat(process.env.RING_WINDOW_MINUTES || "5") * 60 * 1000;
+// The rings only pay off in the process that both ingests and serves HTTP,
+// which is no process at all once WEB_CONCURRENCY > 1
+const RINGS_ENABLED = WEB_CONCURRENCY <= 1;
+const TELEMETRY_TIMESERIES = process.env.TELEMETRY_TIMESERIES === "1";
+const TELEMETRY_TTL_DAYS = parseFloat(process.env.TELEMETRY_TTL_DAYS || "0");
 
+// IMU full-scale ranges (±16 g in m/s², ±2000 °/s in rad/s) mapped onto int16
+const ACC_LSB = (16 * 9.80665) / 32767;
+const GYRO_LSB = (2000 * Math.PI / 180) / 32767;
+
+let mongoClient;
 let db;
 let imuCollection;
 let gpsCollection;
+let clientBulkWrite = false;
+let serverWireVersion = 0;
+const timeseriesCollections = new Set();
+
+// Telemetry is written in batches; w:0 (FAST_INSERT=1) skips the ack round-trip
+const INSERT_OPTIONS = {
+    ordered: false,
+    bypassDocumentValidation: true,
+    ...(FAST_INSERT ? { writeConcern: { w: 0 } } : {}),
+};
 
 // ── MongoDB Initialization ──────────────────────────────────────────────────
 async function initMongo() {
     try {
         console.log("[Mongo] Attempting to connect...");
-        const client = await MongoClient.connect(MONGO_URI);
+        mongoClient = await MongoClient.connect(MONGO_URI, {
+            maxPoolSize: MONGO_MAX_POOL_SIZE,
+            minPoolSize: MONGO_MIN_POOL_SIZE,
+            compressors: MONGO_COMPRESSORS,
+            zlibCompressionLevel: 3,
+        });
         console.log("[Mongo] Client connected successfully");
 
         const dbName = MONGO_URI.split('/').pop().split('?')[0] || 'vehicle_sensor';
-        db = client.db(dbName);
+        db = mongoClient.db(dbName);
         console.log(`[Mongo] Using database: ${dbName}`);
 
         imuCollection = db.collection('imu');
         gpsCollection = db.collection('gps');
 
-        // Create indexes
-        await imuCollection.createIndex({ received_at: 1 });
-        await gpsCollection.createIndex({ received_at: 1 });
-        console.log("[Mongo] Indexes created/verified");
+        // MongoClient.bulkWrite (one command across namespaces) needs 8.0+
+        const hello = await db.command({ hello: 1 });
+        serverWireVersion = hello.maxWireVersion;
+        clientBulkWrite = serverWireVersion >= 25;
+        console.log(`[Mongo] Client bulkWrite ${clientBulkWrite ? "enabled" : "unavailable"}`);
 
         return true;
     } catch (err) {
@@ -53,6 +99,466 @@ async function initMongo() {
     }
 }
 
+// Collection setup runs once, in the process that owns ingest, rather than in
+// every HTTP worker.
+async function ensureCollections() {
+    try {
+        const existing = await db.listCollections({}, { nameOnly: false }).toArray();
+        const names = new Set(existing.map(c => c.name));
+        existing.filter(c => c.type === 'timeseries').forEach(c => timeseriesCollections.add(c.name));
+
+        // Opt-in (TELEMETRY_TIMESERIES=1): new telemetry collections are
+        // bucketed per session by received_at, which compresses better and
+        // speeds range scans, but distinct("day") and estimatedDocumentCount()
+        // then unpack every bucket, and client bulkWrite is unavailable.
+        // Existing regular collections are left as they are.
+        for (const name of ['imu', 'gps']) {
+            if (!TELEMETRY_TIMESERIES || names.has(name)) continue;
+            await db.createCollection(name, {
+                timeseries: { timeField: 'received_at', metaField: 'session', granularity: 'seconds' },
+                ...(TELEMETRY_TTL_DAYS > 0 ? { expireAfterSeconds: TELEMETRY_TTL_DAYS * 86400 } : {}),
+            });
+            timeseriesCollections.add(name);
+            console.log(`[Mongo] Created time-series collection: ${name}`);
+        }
+
+        // Client bulkWrite does not target time-series collections
+        if (timeseriesCollections.size > 0) clientBulkWrite = false;
+    } catch (err) {
+        console.error(`[Mongo] Collection setup error: ${err.message}`);
+        process.exit(1);
+    }
+}
+
+async function backfillLegacyDocs(collection) {
+    const name = collection.collectionName;
+
+    // Backfill the materialized day for documents written before it existed
+    const backfill = [{ $set: { day: { $dateToString: { format: "%Y-%m-%d", date: "$received_at" } } } }];
+    const days = await collection.updateMany({ day: { $exists: false } }, backfill);
+    if (days.modifiedCount) {
+        console.log(`[Mongo] Day backfilled: ${name}=${days.modifiedCount}`);
+    }
+
+    // Same for numeric sessions stored as strings before normalizeSession(),
+    // with the same safe-integer cut-off so both sides keep long ids as strings.
+    // 17+ digits always exceed it; onError only guards the server-side parse.
+    const stringSession = { session: { $type: "string", $regex: /^\d{1,16}$/ } };
+    const asLong = { $convert: { input: "$session", to: "long", onError: "$session" } };
+    const toNumber = [{ $set: { session: {
+        $cond: [{ $lte: [asLong, Number.MAX_SAFE_INTEGER] }, asLong, "$session"]
+    } } }];
+    const sessions = await collection.updateMany(stringSession, toNumber);
+    if (sessions.modifiedCount) {
+        console.log(`[Mongo] Sessions normalized: ${name}=${sessions.modifiedCount}`);
+    }
+}
+
+// Runs in the background once ingest and HTTP are up: the first start on a
+// large legacy collection rewrites every document, which must not hold up
+// serving, and a failure only leaves documents for the next start to finish.
+// Time-series collections were created by this version and never hold
+// documents that predate the day field or normalizeSession().
+function startLegacyBackfill() {
+    Promise.all([imuCollection, gpsCollection]
+        .filter(collection => !timeseriesCollections.has(collection.collectionName))
+        .map(backfillLegacyDocs))
+        .catch(err => console.error(`[Mongo] Legacy backfill error: ${err.message}`));
+}
+
+async function ensureIndexes() {
+    try {
+        // Create indexes: (session, received_at) serves session-filtered range
+        // queries and their sort; received_at alone serves "all sessions" and
+        // /api/gps/latest (read backwards).
+        await Promise.all([imuCollection, gpsCollection].map(collection => {
+            const indexes = [
+                { key: { session: 1, received_at: 1 } },
+                { key: { received_at: 1 } },
+            ];
+            // day is a measurement field on time-series collections, which
+            // only accept secondary indexes on those from 6.0 (wire version 17)
+            if (!timeseriesCollections.has(collection.collectionName) || serverWireVersion >= 17) {
+                indexes.push({ key: { day: -1 } });
+            } else {
+                console.log(`[Mongo] Skipping day index on time-series ${collection.collectionName} (needs 6.0+)`);
+            }
+            return collection.createIndexes(indexes);
+        }));
+        console.log("[Mongo] Indexes created/verified");
+    } catch (err) {
+        console.error(`[Mongo] Index setup error: ${err.message}`);
+        process.exit(1);
+    }
+}
+
+// ── Ingest Queue ─────────────────────────────────────────────────────────────
+// The MQTT handler only enqueues raw messages; workers parse and batch them
+// so Mongo latency never stalls the MQTT network loop.
+// FIFO with a moving head: taking a batch is O(batch) instead of shifting the
+// whole backlog, and the consumed prefix is dropped once it outweighs the rest.
+class IngestQueue {
+    constructor() {
+        this.items = [];
+        this.head = 0;
+    }
+
+    get length() {
+        return this.items.length - this.head;
+    }
+
+    push(item) {
+        this.items.push(item);
+    }
+
+    take(count) {
+        const end = Math.min(this.head + count, this.items.length);
+        const batch = this.items.slice(this.head, end);
+        this.head = end;
+        if (this.head === this.items.length) {
+            this.items = [];
+            this.head = 0;
+        } else if (this.head >= BATCH_SIZE && this.head * 2 >= this.items.length) {
+            this.items = this.items.slice(this.head);
+            this.head = 0;
+        }
+        return batch;
+    }
+}
+
+const ingestQueue = new IngestQueue();
+let droppedMessages = 0;
+let duplicateMessages = 0;
+
+// QoS 1 is at-least-once, and phones republish unacked samples after a
+// reconnect. Two generations of exact keys bound memory while remembering at
+// least the last `capacity` samples.
+class RecentKeys {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.current = new Set();
+        this.previous = new Set();
+    }
+
+    // Records the key and reports whether it had already been seen
+    seen(key) {
+        if (this.current.has(key) || this.previous.has(key)) return true;
+        if (this.current.size >= this.capacity) {
+            this.previous = this.current;
+            this.current = new Set();
+        }
+        this.current.add(key);
+        return false;
+    }
+}
+
+const recentSamples = new RecentKeys(DEDUP_CAPACITY);
+
+function enqueueMessage(topic, message) {
+    if (ingestQueue.length >= INGEST_QUEUE_MAX) {
+        droppedMessages++;
+        return;
+    }
+    ingestQueue.push([topic, message, new Date()]);
+}
+
+// Numeric sessions are stored as numbers whether the phone sends 12 or "12",
+// so ingest and buildQuery agree on the BSON type the session index holds.
+// Ids beyond Number.MAX_SAFE_INTEGER stay strings: parseInt would round them
+// and merge distinct sessions.
+function normalizeSession(session) {
+    if (typeof session !== 'string' || !/^\d+$/.test(session)) return session;
+    const n = parseInt(session, 10);
+    return Number.isSafeInteger(n) ? n : session;
+}
+
+// Stores a reading as an int32 count of `lsb` (4 BSON bytes instead of 8),
+// saturating at the int16 range the sensor full-scale maps onto. `|| 0` folds
+// -0, which BSON would otherwise keep as a double. Six axes save 24 bytes, less
+// the 7-byte `q: 1` marker, so an IMU document shrinks by about 17 bytes.
+function quantize(value, lsb) {
+    if (typeof value !== 'number') return value;
+    const counts = Math.round(value / lsb) || 0;
+    return Math.max(-32767, Math.min(32767, counts));
+}
+
+// Per-topic decoders check the payload shape once and read each field once,
+// so a malformed sample is rejected with a clear reason instead of surfacing
+// as a TypeError or being stored with missing axes.
+function isVector(v) {
+    return v !== null && typeof v === 'object' &&
+        typeof v.x === 'number' && typeof v.y === 'number' && typeof v.z === 'number';
+}
+
+function decodeImu(payload, received_at, day) {
+    const { timestamp, session, acc, gyro } = payload;
+    if (!isVector(acc)) throw new Error("IMU payload needs numeric acc.x/y/z");
+    if (gyro && !isVector(gyro)) throw new Error("IMU payload gyro must have numeric x/y/z");
+
+    return {
+        timestamp: timestamp,
+        session: normalizeSession(session),
+        ax: quantize(acc.x, ACC_LSB),
+        ay: quantize(acc.y, ACC_LSB),
+        az: quantize(acc.z, ACC_LSB),
+        gx: gyro ? quantize(gyro.x, GYRO_LSB) : 0,
+        gy: gyro ? quantize(gyro.y, GYRO_LSB) : 0,
+        gz: gyro ? quantize(gyro.z, GYRO_LSB) : 0,
+        q: 1,
+        received_at: received_at,
+        day: day,
+    };
+}
+
+function decodeGps(payload, received_at, day) {
+    const { timestamp, session, gps } = payload;
+    if (!gps || typeof gps.lat !== 'number' || typeof gps.lon !== 'number') {
+        throw new Error("GPS payload needs numeric gps.lat/lon");
+    }
+
+    return {
+        timestamp: timestamp,
+        session: normalizeSession(session),
+        lat: gps.lat,
+        lon: gps.lon,
+        received_at: received_at,
+        day: day,
+    };
+}
+
+function parseBatch(items) {
+    const imuDocs = [];
+    const gpsDocs = [];
+
+    for (const [topic, message, received_at] of items) {
+        try {
+            const payload = JSON.parse(message.toString());
+            if (payload.timestamp !== undefined &&
+                recentSamples.seen(`${topic}|${payload.session}|${payload.timestamp}`)) {
+                duplicateMessages++;
+                continue;
+            }
+            const day = received_at.toISOString().slice(0, 10);
+
+            if (topic === MQTT_TOPIC_IMU) {
+                imuDocs.push(decodeImu(payload, received_at, day));
+            } else if (topic === MQTT_TOPIC_GPS) {
+                gpsDocs.push(decodeGps(payload, received_at, day));
+            }
+        } catch (err) {
+            console.error(`[MQTT] Message error: ${err.message}`);
+        }
+    }
+
+    return { imuDocs, gpsDocs };
+}
+
+// Both insert paths resolve to whether the batch was written
+async function insertBatch(collection, docs, label) {
+    if (docs.length === 0) return true;
+    try {
+        await collection.insertMany(docs, INSERT_OPTIONS);
+        console.log(`[Mongo] ${label} batch saved: ${docs.length} docs`);
+        return true;
+    } catch (err) {
+        console.error(`[Mongo] ${label} batch error: ${err.message}`);
+        return false;
+    }
+}
+
+// Ships a mixed IMU+GPS burst in a single server round-trip
+async function insertMixedBatch(imuDocs, gpsDocs) {
+    const models = [];
+    for (const document of imuDocs) {
+        models.push({ name: 'insertOne', namespace: imuCollection.namespace, document });
+    }
+    for (const document of gpsDocs) {
+        models.push({ name: 'insertOne', namespace: gpsCollection.namespace, document });
+    }
+
+    try {
+        await mongoClient.bulkWrite(models, INSERT_OPTIONS);
+        console.log(`[Mongo] Mixed batch saved: imu=${imuDocs.length}, gps=${gpsDocs.length}`);
+        return true;
+    } catch (err) {
+        console.error(`[Mongo] Mixed batch error: ${err.message}`);
+        return false;
+    }
+}
+
+async function ingestWorker() {
+    for (;;) {
+        // Let a partial batch accumulate for up to FLUSH_INTERVAL_MS
+        if (ingestQueue.length < BATCH_SIZE) {
+            await sleep(FLUSH_INTERVAL_MS);
+            if (ingestQueue.length === 0) continue;
+        }
+
+        const { imuDocs, gpsDocs } = parseBatch(ingestQueue.take(BATCH_SIZE));
+        const imuSeq = imuRing.reserve();
+        const gpsSeq = gpsRing.reserve();
+
+        let imuSaved;
+        let gpsSaved;
+        if (clientBulkWrite && imuDocs.length > 0 && gpsDocs.length > 0) {
+            imuSaved = gpsSaved = await insertMixedBatch(imuDocs, gpsDocs);
+        } else {
+            [imuSaved, gpsSaved] = await Promise.all([
+                insertBatch(imuCollection, imuDocs, 'IMU'),
+                insertBatch(gpsCollection, gpsDocs, 'GPS'),
+            ]);
+        }
+
+        rememberInserted(imuRing, imuSeq, imuSaved ? imuDocs : [], toImuReading);
+        rememberInserted(gpsRing, gpsSeq, gpsSaved ? gpsDocs : [], toGpsReading);
+    }
+}
+
+function startIngestWorkers() {
+    if (RINGS_ENABLED) {
+        imuRing.coverFrom(Date.now());
+        gpsRing.coverFrom(Date.now());
+    }
+    for (let i = 0; i < INGEST_WORKERS; i++) {
+        ingestWorker();
+    }
+    console.log(`[Ingest] ${INGEST_WORKERS} workers started`);
+}
+
+// ── Recent Samples ───────────────────────────────────────────────────────────
+// The ingest process keeps the newest samples in memory, already shaped like
+// the API responses, so "latest" and short-window polls skip Mongo entirely.
+class RingBuffer {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.times = new Array(capacity);
+        this.items = new Array(capacity);
+        this.start = 0;
+        this.length = 0;
+        // Every sample received at or after sinceMs is still held; undefined
+        // in processes that do not ingest
+        this.sinceMs = undefined;
+        // Batches are admitted in the order they were parsed even when their
+        // inserts finish out of order, so times stay sorted for lowerBound()
+        this.nextSeq = 0;
+        this.commitSeq = 0;
+        this.pending = new Map();
+    }
+
+    reserve() {
+        return this.nextSeq++;
+    }
+
+    // entries: [ms, item] pairs for batch `seq`, empty if its insert failed
+    commit(seq, entries) {
+        this.pending.set(seq, entries);
+        while (this.pending.has(this.commitSeq)) {
+            for (const [ms, item] of this.pending.get(this.commitSeq)) this.push(ms, item);
+            this.pending.delete(this.commitSeq++);
+        }
+    }
+
+    coverFrom(ms) {
+        this.sinceMs = ms;
+    }
+
+    push(ms, item) {
+        const end = (this.start + this.length) % this.capacity;
+        if (this.length === this.capacity) {
+            this.sinceMs = this.times[this.start] + 1;
+            this.start = (this.start + 1) % this.capacity;
+        } else {
+            this.length++;
+        }
+        this.times[end] = ms;
+        this.items[end] = item;
+    }
+
+    // i = 0 is the oldest sample
+    timeAt(i) {
+        return this.times[(this.start + i) % this.capacity];
+    }
+
+    itemAt(i) {
+        return this.items[(this.start + i) % this.capacity];
+    }
+
+    latest() {
+        return this.length > 0 ? this.itemAt(this.length - 1) : undefined;
+    }
+
+    // Index of the first sample received at or after ms
+    lowerBound(ms) {
+        let lo = 0;
+        let hi = this.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (this.timeAt(mid) < ms) lo = mid + 1;
+            else hi = mid;
+        }
+        return lo;
+    }
+}
+
+const imuRing = new RingBuffer(RINGS_ENABLED ? IMU_RING_SIZE : 0);
+const gpsRing = new RingBuffer(RINGS_ENABLED ? GPS_RING_SIZE : 0);
+
+// Samples only become readable once Mongo has accepted them, so the ring
+// never shows data that a longer-window (Mongo) read would not
+function rememberInserted(ring, seq, docs, toReading) {
+    if (!RINGS_ENABLED) return;
+    ring.commit(seq, docs.map(doc => [doc.received_at.getTime(), toReading(doc)]));
+}
+
+function dequantizeValue(value, lsb) {
+    return typeof value === 'number' ? value * lsb : value;
+}
+
+// Same fields and units as IMU_PROJECTION
+function toImuReading(doc) {
+    return {
+        received_at: doc.received_at.toISOString(),
+        ax: dequantizeValue(doc.ax, ACC_LSB),
+        ay: dequantizeValue(doc.ay, ACC_LSB),
+        az: dequantizeValue(doc.az, ACC_LSB),
+        gx: dequantizeValue(doc.gx, GYRO_LSB),
+        gy: dequantizeValue(doc.gy, GYRO_LSB),
+        gz: dequantizeValue(doc.gz, GYRO_LSB),
+        session: doc.session,
+        timestamp: doc.timestamp,
+    };
+}
+
+// Same fields as GPS_PROJECTION
+function toGpsReading(doc) {
+    return {
+        received_at: doc.received_at.toISOString(),
+        lat: doc.lat,
+        lon: doc.lon,
+        session: doc.session,
+        timestamp: doc.timestamp,
+    };
+}
+
+// Answers a "minutes" query from the ring when the whole window is held in
+// memory; returns undefined when the caller has to go to Mongo.
+function readRecent(ring, query) {
+    const parsed = getParsedQuery(query);
+    // Non-numeric "minutes" parse to NaN, which every comparison lets through
+    if (!Number.isFinite(parsed.windowMs) || parsed.windowMs > RING_WINDOW_MS) return undefined;
+
+    const fromMs = Date.now() - parsed.windowMs;
+    if (ring.sinceMs === undefined || !Number.isFinite(fromMs) || fromMs < ring.sinceMs) return undefined;
+
+    const docs = [];
+    const limit = parsed.limit > 0 ? parsed.limit : Infinity;
+    for (let i = ring.lowerBound(fromMs); i < ring.length && docs.length < limit; i++) {
+        const doc = ring.itemAt(i);
+        if (parsed.session === undefined || doc.session === parsed.session) docs.push(doc);
+    }
+    return docs;
+}
+
 // ── MQTT Initialization ──────────────────────────────────────────────────────
 function initMqtt() {
     console.log("[MQTT] Connecting to broker...");
@@ -88,40 +594,7 @@ function initMqtt() {
         client.subscribe(MQTT_TOPIC_GPS, { qos: 1 });
     });
 
-    client.on('message', async (topic, message) => {
-        try {
-            const payload = JSON.parse(message.toString());
-            const received_at = new Date();
-
-            if (topic === MQTT_TOPIC_IMU) {
-                const doc = {
-                    timestamp: payload.timestamp,
-                    session: payload.session,
-                    ax: payload.acc.x,
-                    ay: payload.acc.y,
-                    az: payload.acc.z,
-                    gx: payload.gyro ? payload.gyro.x : 0.0,
-                    gy: payload.gyro ? payload.gyro.y : 0.0,
-                    gz: payload.gyro ? payload.gyro.z : 0.0,
-                    received_at: received_at,
-                };
-                const result = await imuCollection.insertOne(doc);
-                console.log(`[MQTT] IMU data saved: session=${payload.session}, id=${result.insertedId}`);
-            } else if (topic === MQTT_TOPIC_GPS) {
-                const doc = {
-                    timestamp: payload.timestamp,
-                    session: payload.session,
-                    lat: payload.gps.lat,
-                    lon: payload.gps.lon,
-                    received_at: received_at,
-                };
-                const result = await gpsCollection.insertOne(doc);
-                console.log(`[MQTT] GPS data saved: session=${payload.session}, id=${result.insertedId}`);
-            }
-        } catch (err) {
-            console.error(`[MQTT] Message error: ${err.message}`);
-        }
-    });
+    client.on('message', enqueueMessage);
 
     client.on('error', (err) => {
         console.error(`[MQTT] Error: ${err.message}`);
@@ -134,10 +607,83 @@ function initMqtt() {
 
 // ── REST API ─────────────────────────────────────────────────────────────────
 
+// res.json() routes through res.send(), which SHA-1 hashes every body for an
+// ETag. Telemetry bodies change on nearly every poll, so that ETag rarely earns
+// a 304; those responses skip it and are written directly. The small list
+// endpoints that do repeat (/api/sessions, /api/days) keep res.json().
+function sendJson(res, body) {
+    res.set('Content-Type', 'application/json; charset=utf-8');
+    res.end(JSON.stringify(body));
+}
+
+// Session and day lists change slowly but are polled by every dashboard, so
+// they are served from a short-lived cache. The pending promise is cached so
+// concurrent misses share a single Mongo query.
+const listCache = new Map();
+
+function cached(key, load) {
+    const hit = listCache.get(key);
+    if (hit && Date.now() - hit.at < LIST_CACHE_TTL_MS) return hit.value;
+
+    const value = load();
+    listCache.set(key, { at: Date.now(), value });
+    value.catch(() => {
+        // A slow load can fail after a newer one replaced it; keep the newer
+        if (listCache.get(key)?.value === value) listCache.delete(key);
+    });
+    return value;
+}
+
 app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'templates', 'index.html'));
 });
 
+function ingestStats() {
+    return {
+        ingest_queue: ingestQueue.length,
+        ingest_dropped: droppedMessages,
+        ingest_duplicates: duplicateMessages,
+    };
+}
+
+// Ingest runs only in the primary, so HTTP-only cluster workers ask it over
+// IPC; if it does not answer in time the fields are left out, not zeroed.
+const INGEST_STATS_TIMEOUT_MS = 1000;
+const pendingStatsRequests = new Map();
+let nextStatsRequestId = 0;
+
+function requestIngestStats() {
+    return new Promise(resolve => {
+        const id = nextStatsRequestId++;
+        const timer = setTimeout(() => {
+            pendingStatsRequests.delete(id);
+            resolve({});
+        }, INGEST_STATS_TIMEOUT_MS);
+        pendingStatsRequests.set(id, stats => {
+            clearTimeout(timer);
+            resolve(stats);
+        });
+
+        try {
+            process.send({ type: 'ingest_stats', id });
+        } catch (err) {
+            pendingStatsRequests.get(id)({});
+            pendingStatsRequests.delete(id);
+        }
+    });
+}
+
+if (cluster.isWorker) {
+    process.on('message', (msg) => {
+        if (msg?.type !== 'ingest_stats') return;
+        const reply = pendingStatsRequests.get(msg.id);
+        if (reply) {
+            pendingStatsRequests.delete(msg.id);
+            reply(msg.stats);
+        }
+    });
+}
+
 app.get('/api/health', async (req, res) => {
     let mongoStatus = "error";
     let mongoDetails = "Not connected";
@@ -152,21 +698,26 @@ app.get('/api/health', async (req, res) => {
         mongoDetails = err.message;
     }
 
-    res.json({
+    sendJson(res, {
         status: "ok",
         mongo: mongoStatus,
         mongo_details: mongoDetails,
-        mongo_ready: !!db
+        mongo_ready: !!db,
+        ...(cluster.isPrimary ? ingestStats() : await requestIngestStats()),
     });
 });
 
 app.get('/api/sessions', async (req, res) => {
     try {
-        const imuSessions = await imuCollection.distinct("session");
-        const gpsSessions = await gpsCollection.distinct("session");
-        const allSessions = [...new Set([...imuSessions, ...gpsSessions])].sort((a, b) => {
-            if (typeof a === 'number' && typeof b === 'number') return b - a;
-            return String(b).localeCompare(String(a));
+        const allSessions = await cached('sessions', async () => {
+            const [imuSessions, gpsSessions] = await Promise.all([
+                imuCollection.distinct("session"),
+                gpsCollection.distinct("session"),
+            ]);
+            return [...new Set([...imuSessions, ...gpsSessions])].sort((a, b) => {
+                if (typeof a === 'number' && typeof b === 'number') return b - a;
+                return String(b).localeCompare(String(a));
+            });
         });
         res.json(allSessions);
     } catch (err) {
@@ -174,46 +725,164 @@ app.get('/api/sessions', async (req, res) => {
     }
 });
 
-function buildQuery(query) {
-    const filter = {};
+// Writes a cursor as a JSON array one Mongo batch at a time, so the first bytes
+// leave as soon as the first batch arrives instead of after the last one.
+async function streamJson(res, cursor) {
+    res.set('Content-Type', 'application/json; charset=utf-8');
+    let chunk = '[';
+    let first = true;
+
+    for await (const doc of cursor) {
+        chunk += (first ? '' : ',') + JSON.stringify(doc);
+        first = false;
+
+        // Buffer drained: the next document needs a round-trip, so flush now
+        if (cursor.bufferedCount() === 0) {
+            if (res.destroyed) break;
+            if (!res.write(chunk)) {
+                // Abort the losing once() so its listeners don't pile up per batch
+                const settled = new AbortController();
+                try {
+                    await Promise.race([
+                        once(res, 'drain', { signal: settled.signal }),
+                        once(res, 'close', { signal: settled.signal }),
+                    ]);
+                } finally {
+                    settled.abort();
+                }
+            }
+            chunk = '';
+        }
+    }
+
+    if (!res.destroyed) res.end(chunk + ']');
+}
+
+// Same shape as Date#toISOString(), formatted by Mongo so the driver hands back
+// plain strings instead of Date objects that JSON.stringify would re-format.
+const ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%LZ";
+
+// Pipeline stages are built once; handlers only supply $match and the limit
+const SORT_BY_RECEIVED = { $sort: { received_at: 1 } };
+
+// Documents flagged q:1 hold quantized counts; older documents hold raw doubles
+function dequantize(field, lsb) {
+    return { $cond: [{ $eq: ["$q", 1] }, { $multiply: [`$${field}`, lsb] }, `$${field}`] };
+}
+
+const IMU_VALUES = {
+    ax: dequantize("ax", ACC_LSB), ay: dequantize("ay", ACC_LSB), az: dequantize("az", ACC_LSB),
+    gx: dequantize("gx", GYRO_LSB), gy: dequantize("gy", GYRO_LSB), gz: dequantize("gz", GYRO_LSB),
+};
+
+const IMU_PROJECTION = { $project: {
+    _id: 0, received_at: { $dateToString: { format: ISO_FORMAT, date: "$received_at" } },
+    ...IMU_VALUES, session: 1, timestamp: 1
+}};
+
+const GPS_PROJECTION = { $project: {
+    _id: 0, received_at: { $dateToString: { format: ISO_FORMAT, date: "$received_at" } },
+    lat: 1, lon: 1, session: 1, timestamp: 1
+}};
+
+const IMU_STATS_GROUP = { $group: {
+    _id: null,
+    count:  { $sum: 1 },
+    ax_avg: { $avg: IMU_VALUES.ax }, ax_min: { $min: IMU_VALUES.ax }, ax_max: { $max: IMU_VALUES.ax },
+    ay_avg: { $avg: IMU_VALUES.ay }, ay_min: { $min: IMU_VALUES.ay }, ay_max: { $max: IMU_VALUES.ay },
+    az_avg: { $avg: IMU_VALUES.az }, az_min: { $min: IMU_VALUES.az }, az_max: { $max: IMU_VALUES.az },
+    gx_avg: { $avg: IMU_VALUES.gx }, gx_min: { $min: IMU_VALUES.gx }, gx_max: { $max: IMU_VALUES.gx },
+    gy_avg: { $avg: IMU_VALUES.gy }, gy_min: { $min: IMU_VALUES.gy }, gy_max: { $max: IMU_VALUES.gy },
+    gz_avg: { $avg: IMU_VALUES.gz }, gz_min: { $min: IMU_VALUES.gz }, gz_max: { $max: IMU_VALUES.gz },
+}};
+
+const STREAM_OPTIONS = { batchSize: STREAM_BATCH_SIZE };
+const LATEST_OPTIONS = {
+    sort: { received_at: -1 },
+    projection: { _id: 0, received_at: 1, lat: 1, lon: 1, session: 1, timestamp: 1 },
+};
+
+// Dashboards repeat the same handful of query strings, so the parsed form is
+// memoized. Only the parse is cached: "minutes" stays relative to now, and a
+// fresh filter is built on each call because the driver may hold on to it.
+const parsedQueryCache = new Map();
+
+function parseQuery(query) {
+    // Mirrors cursor.limit(): 0 means no limit, a negative n returns |n| docs
     const limit = parseInt(query.limit || "2000");
+    const parsed = { limit: Number.isFinite(limit) ? Math.abs(limit) : 2000 };
 
     if (query.session && query.session !== "all") {
-        const sessionInt = parseInt(query.session);
-        filter.session = isNaN(sessionInt) ? query.session : sessionInt;
+        parsed.session = normalizeSession(query.session);
     }
 
     if (query.minutes) {
-        const dtFrom = new Date(Date.now() - parseFloat(query.minutes) * 60 * 1000);
-        filter.received_at = { $gte: dtFrom };
+        parsed.windowMs = parseFloat(query.minutes) * 60 * 1000;
     } else {
-        const dtFilter = {};
-        if (query.from_dt) {
-            dtFilter.$gte = new Date(query.from_dt);
-        }
-        if (query.to_dt) {
-            dtFilter.$lte = new Date(query.to_dt);
-        }
-        if (Object.keys(dtFilter).length > 0) {
-            filter.received_at = dtFilter;
+        if (query.from_dt) parsed.fromMs = new Date(query.from_dt).getTime();
+        if (query.to_dt) parsed.toMs = new Date(query.to_dt).getTime();
+    }
+
+    return parsed;
+}
+
+function getParsedQuery(query) {
+    // JSON keeps a missing param, the string "undefined", and an array
+    // distinct, so one client's parse is never served for another's input
+    const key = JSON.stringify([query.limit, query.session, query.minutes, query.from_dt, query.to_dt]);
+    let parsed = parsedQueryCache.get(key);
+
+    if (parsed) {
+        // Re-insert so Map order doubles as least-recently-used order
+        parsedQueryCache.delete(key);
+    } else {
+        parsed = parseQuery(query);
+        if (parsedQueryCache.size >= QUERY_CACHE_SIZE) {
+            parsedQueryCache.delete(parsedQueryCache.keys().next().value);
         }
     }
+    parsedQueryCache.set(key, parsed);
+    return parsed;
+}
 
-    return { filter, limit };
+// $limit rejects 0, so "no limit" is expressed by leaving the stage out
+function limitStages(limit) {
+    return limit > 0 ? [{ $limit: limit }] : [];
+}
+
+function buildQuery(query) {
+    const parsed = getParsedQuery(query);
+    const filter = {};
+
+    if (parsed.session !== undefined) {
+        filter.session = parsed.session;
+    }
+
+    if (parsed.windowMs !== undefined) {
+        filter.received_at = { $gte: new Date(Date.now() - parsed.windowMs) };
+    } else if (parsed.fromMs !== undefined || parsed.toMs !== undefined) {
+        const dtFilter = {};
+        if (parsed.fromMs !== undefined) dtFilter.$gte = new Date(parsed.fromMs);
+        if (parsed.toMs !== undefined) dtFilter.$lte = new Date(parsed.toMs);
+        filter.received_at = dtFilter;
+    }
+
+    return { filter, limit: parsed.limit };
 }
 
 app.get('/api/imu', async (req, res) => {
     try {
+        const recent = readRecent(imuRing, req.query);
+        if (recent) return sendJson(res, recent);
+
         const { filter, limit } = buildQuery(req.query);
-        const docs = await imuCollection.find(filter, {
-            projection: { _id: 0, received_at: 1, ax: 1, ay: 1, az: 1, gx: 1, gy: 1, gz: 1, session: 1, timestamp: 1 }
-        })
-        .sort({ received_at: 1 })
-        .limit(limit)
-        .toArray();
-        
-        res.json(docs);
+        const cursor = imuCollection.aggregate([
+            { $match: filter }, SORT_BY_RECEIVED, ...limitStages(limit), IMU_PROJECTION
+        ], STREAM_OPTIONS);
+
+        await streamJson(res, cursor);
     } catch (err) {
+        if (res.headersSent) return res.destroy(err);
         res.status(500).json({ error: err.message });
     }
 });
@@ -221,25 +890,12 @@ app.get('/api/imu', async (req, res) => {
 app.get('/api/imu/stats', async (req, res) => {
     try {
         const { filter } = buildQuery(req.query);
-        const pipeline = [
-            { $match: filter },
-            { $group: {
-                _id: null,
-                count:  { $sum: 1 },
-                ax_avg: { $avg: "$ax" }, ax_min: { $min: "$ax" }, ax_max: { $max: "$ax" },
-                ay_avg: { $avg: "$ay" }, ay_min: { $min: "$ay" }, ay_max: { $max: "$ay" },
-                az_avg: { $avg: "$az" }, az_min: { $min: "$az" }, az_max: { $max: "$az" },
-                gx_avg: { $avg: "$gx" }, gx_min: { $min: "$gx" }, gx_max: { $max: "$gx" },
-                gy_avg: { $avg: "$gy" }, gy_min: { $min: "$gy" }, gy_max: { $max: "$gy" },
-                gz_avg: { $avg: "$gz" }, gz_min: { $min: "$gz" }, gz_max: { $max: "$gz" },
-            }}
-        ];
-        const result = await imuCollection.aggregate(pipeline).toArray();
+        const result = await imuCollection.aggregate([{ $match: filter }, IMU_STATS_GROUP]).toArray();
         if (result.length > 0) {
             delete result[0]._id;
-            res.json(result[0]);
+            sendJson(res, result[0]);
         } else {
-            res.json({});
+            sendJson(res, {});
         }
     } catch (err) {
         res.status(500).json({ error: err.message });
@@ -248,35 +904,48 @@ app.get('/api/imu/stats', async (req, res) => {
 
 app.get('/api/gps', async (req, res) => {
     try {
+        const recent = readRecent(gpsRing, req.query);
+        if (recent) return sendJson(res, recent);
+
         const { filter, limit } = buildQuery(req.query);
-        const docs = await gpsCollection.find(filter, {
-            projection: { _id: 0, received_at: 1, lat: 1, lon: 1, session: 1, timestamp: 1 }
-        })
-        .sort({ received_at: 1 })
-        .limit(limit)
-        .toArray();
-
-        res.json(docs);
+        const cursor = gpsCollection.aggregate([
+            { $match: filter }, SORT_BY_RECEIVED, ...limitStages(limit), GPS_PROJECTION
+        ], STREAM_OPTIONS);
+
+        await streamJson(res, cursor);
     } catch (err) {
+        if (res.headersSent) return res.destroy(err);
         res.status(500).json({ error: err.message });
     }
 });
 
 app.get('/api/gps/latest', async (req, res) => {
     try {
-        const doc = await gpsCollection.findOne({}, { sort: { received_at: -1 } });
-        res.json(doc);
+        const doc = gpsRing.latest() || await gpsCollection.findOne({}, LATEST_OPTIONS);
+        sendJson(res, doc);
     } catch (err) {
         res.status(500).json({ error: err.message });
     }
 });
 
+// Unfiltered totals come from collection metadata instead of a full count;
+// filtered counts are pinned to the index matching the filter's leading key.
+function countDocs(collection, filter) {
+    if (Object.keys(filter).length === 0) {
+        return collection.estimatedDocumentCount();
+    }
+    const hint = filter.session !== undefined ? { session: 1, received_at: 1 } : { received_at: 1 };
+    return collection.countDocuments(filter, { hint });
+}
+
 app.get('/api/summary', async (req, res) => {
     try {
         const { filter } = buildQuery(req.query);
-        const imuCount = await imuCollection.countDocuments(filter);
-        const gpsCount = await gpsCollection.countDocuments(filter);
-        res.json({
+        const [imuCount, gpsCount] = await Promise.all([
+            countDocs(imuCollection, filter),
+            countDocs(gpsCollection, filter),
+        ]);
+        sendJson(res, {
             imu_count: imuCount,
             gps_count: gpsCount
         });
@@ -287,25 +956,16 @@ app.get('/api/summary', async (req, res) => {
 
 app.get('/api/days', async (req, res) => {
     try {
-        const pipeline = [
-            { $group: { _id: {
-                y: { $year: "$received_at" },
-                m: { $month: "$received_at" },
-                d: { $dayOfMonth: "$received_at" }
-            }}},
-            { $sort: { "_id.y": -1, "_id.m": -1, "_id.d": -1 } },
-            { $limit: 90 }
-        ];
-        const daysImu = await imuCollection.aggregate(pipeline).toArray();
-        const daysGps = await gpsCollection.aggregate(pipeline).toArray();
-        
-        const daysSet = new Set();
-        [...daysImu, ...daysGps].forEach(d => {
-            const v = d._id;
-            daysSet.add(`${v.y}-${String(v.m).padStart(2, '0')}-${String(v.d).padStart(2, '0')}`);
+        const days = await cached('days', async () => {
+            // "YYYY-MM-DD" is materialized at ingest, so this is an index walk
+            // over distinct days rather than a scan of every document.
+            const [daysImu, daysGps] = await Promise.all([
+                imuCollection.distinct("day"),
+                gpsCollection.distinct("day"),
+            ]);
+            return [...new Set([...daysImu, ...daysGps])].sort().reverse().slice(0, 90);
         });
-        
-        res.json([...daysSet].sort().reverse());
+        res.json(days);
     } catch (err) {
         res.status(500).json({ error: err.message });
     }
@@ -314,11 +974,57 @@ app.get('/api/days', async (req, res) => {
 // ── Start Server ─────────────────────────────────────────────────────────────
 const PORT = process.env.PORT || 5000;
 
+const WORKER_RESTART_MIN_MS = 1000;
+const WORKER_RESTART_MAX_MS = 60000;
+const WORKER_STABLE_MS = 30000;
+const workerStartedAt = new Map();
+let restartDelayMs = 0;
+
+function forkWorker() {
+    const worker = cluster.fork();
+    workerStartedAt.set(worker.id, Date.now());
+}
+
 async function start() {
     await initMongo();
-    initMqtt();
+
+    // A single process owns the MQTT subscription and the ingest workers; with
+    // WEB_CONCURRENCY > 1 it forks HTTP-only workers that share PORT.
+    if (cluster.isPrimary) {
+        await ensureCollections();
+        await ensureIndexes();
+        startIngestWorkers();
+        initMqtt();
+
+        if (WEB_CONCURRENCY > 1) {
+            for (let i = 0; i < WEB_CONCURRENCY; i++) {
+                forkWorker();
+            }
+            cluster.on('exit', (worker, code) => {
+                // Workers that die soon after starting (e.g. Mongo unreachable)
+                // back off exponentially instead of fork-looping
+                const lived = Date.now() - workerStartedAt.get(worker.id);
+                workerStartedAt.delete(worker.id);
+                restartDelayMs = lived >= WORKER_STABLE_MS
+                    ? WORKER_RESTART_MIN_MS
+                    : Math.min(Math.max(restartDelayMs * 2, WORKER_RESTART_MIN_MS), WORKER_RESTART_MAX_MS);
+                console.error(`[Cluster] Worker ${worker.process.pid} exited (code ${code}), restarting in ${restartDelayMs} ms`);
+                setTimeout(forkWorker, restartDelayMs);
+            });
+            cluster.on('message', (worker, msg) => {
+                if (msg?.type === 'ingest_stats') {
+                    worker.send({ type: 'ingest_stats', id: msg.id, stats: ingestStats() });
+                }
+            });
+            console.log(`[Cluster] ${WEB_CONCURRENCY} HTTP workers started`);
+            startLegacyBackfill();
+            return;
+        }
+    }
+
     app.listen(PORT, '0.0.0.0', () => {
         console.log(`Server running on http://0.0.0.0:${PORT}`);
+        if (cluster.isPrimary) startLegacyBackfill();
     });
 }
 